@@ -0,0 +1,153 @@
+import gzip
+import json
+import secrets
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, ArchivedOrder, ArchivedOrderItem, ArchivedCryptoPayment
+
+# Only finished orders are moved out of the hot tables
+ARCHIVABLE_STATUSES = ('shipped', 'cancelled')
+
+# Default cutoff date: orders created before it can be archived
+def get_archive_cutoff(days=None):
+    if days is None:
+        days = settings.ORDER_ARCHIVE_AFTER_DAYS
+    return timezone.now() - timedelta(days=days)
+
+# Orders eligible for archival
+def archivable_orders(cutoff):
+    return Order.objects.filter(status__in=ARCHIVABLE_STATUSES, date_created__lt=cutoff)
+
+# JSON representation of an order, shared by the cold-storage files and the NDJSON exports
+def order_to_dict(order):
+    data = {
+        'id': order.id,
+        'user': order.user_id,
+        'total_price': str(order.total_price),
+        'status': order.status,
+        'payment_method': order.payment_method,
+        'date_created': order.date_created.isoformat(),
+        'items': [
+            {'id': item.id, 'product': item.product_id, 'quantity': item.quantity, 'price': str(item.price)}
+            for item in order.items.all()
+        ],
+        'crypto_payment': None,
+    }
+    payment = getattr(order, 'crypto_payment', None)
+    if payment is not None:
+        data['crypto_payment'] = {
+            'id': payment.id,
+            'wallet_address': payment.wallet_address,
+            'crypto_amount': str(payment.crypto_amount),
+            'crypto_currency': payment.crypto_currency,
+            'exchange_rate': None if payment.exchange_rate is None else str(payment.exchange_rate),
+            'rate_fetched_at': None if payment.rate_fetched_at is None else payment.rate_fetched_at.isoformat(),
+            'transaction_hash': payment.transaction_hash,
+            'is_confirmed': payment.is_confirmed,
+            'created_at': payment.created_at.isoformat(),
+        }
+    return data
+
+# Copy one chunk of orders (with items and payment) into the archive tables
+def _copy_to_archive(orders):
+    archived_orders = []
+    archived_items = []
+    archived_payments = []
+    for order in orders:
+        archived_orders.append(ArchivedOrder(
+            id=order.id,
+            user_id=order.user_id,
+            total_price=order.total_price,
+            status=order.status,
+            payment_method=order.payment_method,
+            date_created=order.date_created,
+        ))
+        for item in order.items.all():
+            archived_items.append(ArchivedOrderItem(
+                id=item.id,
+                order_id=order.id,
+                product_id=item.product_id,
+                quantity=item.quantity,
+                price=item.price,
+            ))
+        payment = getattr(order, 'crypto_payment', None)
+        if payment is not None:
+            archived_payments.append(ArchivedCryptoPayment(
+                id=payment.id,
+                order_id=order.id,
+                wallet_address=payment.wallet_address,
+                crypto_amount=payment.crypto_amount,
+                crypto_currency=payment.crypto_currency,
+                exchange_rate=payment.exchange_rate,
+                rate_fetched_at=payment.rate_fetched_at,
+                transaction_hash=payment.transaction_hash,
+                is_confirmed=payment.is_confirmed,
+                created_at=payment.created_at,
+            ))
+    ArchivedOrder.objects.bulk_create(archived_orders)
+    ArchivedOrderItem.objects.bulk_create(archived_items)
+    ArchivedCryptoPayment.objects.bulk_create(archived_payments)
+
+# Open a new export file; the random suffix and 'x' mode guarantee an earlier export is never overwritten
+def _open_export_file(export_dir):
+    export_dir = Path(export_dir)
+    export_dir.mkdir(parents=True, exist_ok=True)
+    export_path = export_dir / f"orders-{timezone.now():%Y%m%dT%H%M%S}-{secrets.token_hex(4)}.jsonl.gz"
+    return export_path, gzip.open(export_path, 'xt', encoding='utf-8')
+
+# Move old shipped/cancelled orders into the archive tables, one transaction per chunk.
+# When export_dir is given, every archived order is also appended to a gzip JSONL file
+# (created on the first archived chunk, so a run that archives nothing leaves no file).
+# Returns (number of archived orders, export file path or None).
+def archive_orders(cutoff, chunk_size=None, export_dir=None):
+    if chunk_size is None:
+        chunk_size = settings.ORDER_ARCHIVE_CHUNK_SIZE
+
+    export_path = None
+    export_file = None
+    archived = 0
+    last_id = 0
+    try:
+        while True:
+            with transaction.atomic():
+                # Lock the next chunk (keyset pagination on the primary key)
+                ids = list(
+                    archivable_orders(cutoff)
+                    .filter(id__gt=last_id)
+                    .order_by('id')
+                    .select_for_update()
+                    .values_list('id', flat=True)[:chunk_size]
+                )
+                if not ids:
+                    break
+
+                orders = list(
+                    Order.objects.filter(id__in=ids)
+                    .select_related('crypto_payment')
+                    .prefetch_related('items')
+                    .order_by('id')
+                )
+                _copy_to_archive(orders)
+                lines = [json.dumps(order_to_dict(order)) + '\n' for order in orders]
+                Order.objects.filter(id__in=ids).delete()
+
+            # Written once the chunk is committed, so the export never contains orders that are still live.
+            # The archive tables remain the source of truth if the write itself fails.
+            if export_dir is not None:
+                if export_file is None:
+                    export_path, export_file = _open_export_file(export_dir)
+                export_file.writelines(lines)
+                export_file.flush()
+
+            archived += len(ids)
+            last_id = ids[-1]
+    finally:
+        if export_file is not None:
+            export_file.close()
+
+    return archived, export_path
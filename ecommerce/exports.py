@@ -0,0 +1,107 @@
+import csv
+import json
+import zlib
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .archive import order_to_dict
+from .models import Order, ArchivedOrder
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+# One CSV row per order line (orders without lines get a single row with empty item columns)
+CSV_HEADER = [
+    'order_id', 'user_id', 'date_created', 'status', 'payment_method', 'total_price',
+    'item_id', 'product_id', 'quantity', 'price',
+    'crypto_currency', 'crypto_amount', 'exchange_rate', 'crypto_confirmed', 'transaction_hash',
+]
+
+# Start of a day as an aware datetime (range filters on date_created can then use its index)
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+# Orders for an export: optional user, date range (inclusive dates) and archived orders
+def export_querysets(user_id=None, date_from=None, date_to=None, include_archived=False):
+    models = (Order, ArchivedOrder) if include_archived else (Order,)
+    for model in models:
+        qs = model.objects.all()
+        if user_id is not None:
+            qs = qs.filter(user_id=user_id)
+        if date_from is not None:
+            qs = qs.filter(date_created__gte=_start_of_day(date_from))
+        if date_to is not None:
+            qs = qs.filter(date_created__lt=_start_of_day(date_to + timedelta(days=1)))
+        yield qs
+
+# Iterate orders chunk by chunk (keyset pagination on the id), prefetching lines and payment per chunk.
+# Only one chunk is held in memory, whatever the size of the export.
+def iter_orders(querysets, chunk_size=None):
+    if chunk_size is None:
+        chunk_size = settings.ORDER_EXPORT_CHUNK_SIZE
+    for qs in querysets:
+        last_id = 0
+        while True:
+            chunk = list(
+                qs.filter(id__gt=last_id)
+                .select_related('crypto_payment')
+                .prefetch_related('items')
+                .order_by('id')[:chunk_size]
+            )
+            if not chunk:
+                break
+            yield from chunk
+            last_id = chunk[-1].id
+
+# CSV columns describing the crypto payment of an order (empty when paid in cash)
+def _payment_columns(order):
+    payment = getattr(order, 'crypto_payment', None)
+    if payment is None:
+        return ['', '', '', '', '']
+    return [
+        payment.crypto_currency, payment.crypto_amount, payment.exchange_rate or '',
+        payment.is_confirmed, payment.transaction_hash or '',
+    ]
+
+# File-like object whose write() returns the value instead of storing it (used by csv.writer)
+class _Echo:
+    def write(self, value):
+        return value
+
+# CSV export, as an iterator of text lines
+def iter_csv(orders):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for order in orders:
+        order_columns = [
+            order.id, order.user_id, order.date_created.isoformat(), order.status,
+            order.payment_method, order.total_price,
+        ]
+        payment_columns = _payment_columns(order)
+        items = order.items.all()
+        if not items:
+            yield writer.writerow(order_columns + ['', '', '', ''] + payment_columns)
+        for item in items:
+            yield writer.writerow(
+                order_columns + [item.id, item.product_id, item.quantity, item.price] + payment_columns
+            )
+
+# NDJSON export (one JSON object per order, same schema as the archive files), as an iterator of text lines
+def iter_ndjson(orders):
+    for order in orders:
+        yield json.dumps(order_to_dict(order)) + '\n'
+
+# Compress a stream of text chunks into gzip bytes on the fly
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) # +16: gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+# Gzip-compressed export of the given orders, as an iterator of bytes
+def export_orders(orders, export_format):
+    rows = iter_csv(orders) if export_format == 'csv' else iter_ndjson(orders)
+    return gzip_stream(rows)
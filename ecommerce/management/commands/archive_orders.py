@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ecommerce.archive import archive_orders, get_archive_cutoff
+
+
+# Usage: python manage.py archive_orders [--days N] [--chunk-size N] [--export-dir DIR | --no-export]
+class Command(BaseCommand):
+    help = "Move shipped/cancelled orders older than the cutoff into the archive tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+                            help="Archive orders created more than this many days ago")
+        parser.add_argument('--chunk-size', type=int, default=settings.ORDER_ARCHIVE_CHUNK_SIZE,
+                            help="Number of orders moved per transaction")
+        parser.add_argument('--export-dir', default=settings.ORDER_ARCHIVE_DIR,
+                            help="Directory for the compressed JSONL export")
+        parser.add_argument('--no-export', action='store_true',
+                            help="Only move rows to the archive tables, without writing an export file")
+
+    def handle(self, *args, **options):
+        cutoff = get_archive_cutoff(options['days'])
+        export_dir = None if options['no_export'] else options['export_dir']
+
+        archived, export_path = archive_orders(cutoff, chunk_size=options['chunk_size'], export_dir=export_dir)
+
+        self.stdout.write(self.style.SUCCESS(f"{archived} order(s) archived (created before {cutoff:%Y-%m-%d})"))
+        if export_path is not None:
+            self.stdout.write(f"Export written to {export_path}")
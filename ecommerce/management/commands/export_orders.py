@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from ecommerce.exports import EXPORT_FORMATS, export_querysets, iter_orders, export_orders
+
+
+# Usage: python manage.py export_orders OUTPUT [--format csv|ndjson] [--from DATE] [--to DATE] [--user ID] [--include-archived]
+class Command(BaseCommand):
+    help = "Write a gzip-compressed export of orders (with lines and crypto payment status)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Path of the .gz file to write")
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--from', dest='date_from', help="First day included (YYYY-MM-DD)")
+        parser.add_argument('--to', dest='date_to', help="Last day included (YYYY-MM-DD)")
+        parser.add_argument('--user', type=int, help="Only export the orders of this user id")
+        parser.add_argument('--include-archived', action='store_true', help="Also export archived orders")
+        parser.add_argument('--chunk-size', type=int, default=settings.ORDER_EXPORT_CHUNK_SIZE,
+                            help="Number of orders loaded per query")
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ('date_from', 'date_to'):
+            value = options[name]
+            try:
+                dates[name] = parse_date(value) if value else None
+            except ValueError: # Well-formed but impossible date (e.g. 2024-02-30)
+                dates[name] = None
+            if value and dates[name] is None:
+                raise CommandError(f"Invalid date: {value} (expected YYYY-MM-DD)")
+
+        querysets = export_querysets(options['user'], dates['date_from'], dates['date_to'], options['include_archived'])
+        orders = iter_orders(querysets, chunk_size=options['chunk_size'])
+
+        with open(options['output'], 'wb') as output:
+            for data in export_orders(orders, options['format']):
+                output.write(data)
+
+        self.stdout.write(self.style.SUCCESS(f"Export written to {options['output']}"))
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ecommerce.recommendations import rebuild_cooccurrence, trim_cooccurrence
+
+
+# Usage: python manage.py rebuild_cooccurrence [--chunk-size N] [--product-chunk-size N] [--keep N] [--trim-only]
+# Orders created while the rebuild runs are replayed into the new index when it is swapped in;
+# orders still being created at its start or end may be counted twice until the next rebuild.
+class Command(BaseCommand):
+    help = "Rebuild the \"frequently bought together\" index from all order lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=settings.COOCCURRENCE_REBUILD_CHUNK_SIZE,
+                            help="Number of order ids counted per query")
+        parser.add_argument('--product-chunk-size', type=int, default=settings.COOCCURRENCE_REBUILD_PRODUCT_CHUNK_SIZE,
+                            help="Number of product ids counted together (bounds memory use)")
+        parser.add_argument('--keep', type=int, default=settings.COOCCURRENCE_KEEP_PER_PRODUCT,
+                            help="Number of pairs kept per product")
+        parser.add_argument('--trim-only', action='store_true',
+                            help="Only trim every product to --keep pairs (cheap, meant to run periodically)")
+
+    def handle(self, *args, **options):
+        if options['trim_only']:
+            deleted = trim_cooccurrence(keep=options['keep'])
+            self.stdout.write(self.style.SUCCESS(f"Co-occurrence index trimmed ({deleted} pair(s) deleted)"))
+            return
+
+        pairs = rebuild_cooccurrence(chunk_size=options['chunk_size'], keep=options['keep'],
+                                     product_chunk_size=options['product_chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Co-occurrence index rebuilt ({pairs} product pair(s))"))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0003_order_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCooccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cooccurrences', to='ecommerce.product')),
+                ('related_product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ecommerce.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', '-count'], name='ecommerce_p_product_b1cdae_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'related_product'), name='unique_product_cooccurrence')],
+            },
+        ),
+    ]
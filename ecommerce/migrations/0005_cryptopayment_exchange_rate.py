@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0004_product_cooccurrence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedcryptopayment',
+            name='exchange_rate',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedcryptopayment',
+            name='rate_fetched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='cryptopayment',
+            name='exchange_rate',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='cryptopayment',
+            name='rate_fetched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
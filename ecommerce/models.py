@@ -61,6 +61,10 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS, default='cash')
     date_created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Lets the archival job find old shipped/cancelled orders without a full table scan
+        indexes = [models.Index(fields=['status', 'date_created'])]
+
 # Model for items linked to an order (preserves price history at time of purchase)
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
@@ -72,8 +76,56 @@ class OrderItem(models.Model):
 class CryptoPayment(models.Model):
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name="crypto_payment")
     wallet_address = models.CharField(max_length=255) # Client's wallet address
-    crypto_amount = models.DecimalField(max_digits=20, decimal_places=8) # Amount in USDT
-    crypto_currency = models.CharField(max_length=10, default='USDT') # Fixed to USDT
+    crypto_amount = models.DecimalField(max_digits=20, decimal_places=8) # Amount in crypto_currency
+    crypto_currency = models.CharField(max_length=10, default='USDT') # USDT, USDC, BTC or ETH
+    exchange_rate = models.DecimalField(max_digits=20, decimal_places=8, null=True, blank=True) # USD price of 1 unit used for the amount
+    rate_fetched_at = models.DateTimeField(null=True, blank=True) # When that rate was fetched
     transaction_hash = models.CharField(max_length=255, blank=True, null=True) # Blockchain transaction hash
     is_confirmed = models.BooleanField(default=False) # Reception confirmation
     created_at = models.DateTimeField(auto_now_add=True)
+
+# "Frequently bought together" index: how many orders contain both products
+class ProductCooccurrence(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="cooccurrences")
+    related_product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    count = models.PositiveIntegerField(default=0) # Number of orders containing both products
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related_product'], name='unique_product_cooccurrence')
+        ]
+        # Top-K lookups for a product read this index in order
+        indexes = [models.Index(fields=['product', '-count'])]
+
+# --- ARCHIVE (cold storage for completed orders) ---
+
+# Archived copy of a shipped/cancelled order (keeps the original order id)
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True) # Same id as the original Order
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_orders")
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_METHODS)
+    date_created = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+# Archived copy of an order line
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True) # Same id as the original OrderItem
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name="items")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+# Archived copy of the crypto payment attached to an order (if any)
+class ArchivedCryptoPayment(models.Model):
+    id = models.BigIntegerField(primary_key=True) # Same id as the original CryptoPayment
+    order = models.OneToOneField(ArchivedOrder, on_delete=models.CASCADE, related_name="crypto_payment")
+    wallet_address = models.CharField(max_length=255)
+    crypto_amount = models.DecimalField(max_digits=20, decimal_places=8)
+    crypto_currency = models.CharField(max_length=10)
+    exchange_rate = models.DecimalField(max_digits=20, decimal_places=8, null=True, blank=True)
+    rate_fetched_at = models.DateTimeField(null=True, blank=True)
+    transaction_hash = models.CharField(max_length=255, blank=True, null=True)
+    is_confirmed = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
@@ -0,0 +1,174 @@
+import json
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+# Raised when no usable rate (fresh or stale) can be returned
+class RateUnavailable(Exception):
+    pass
+
+# A rate at a point in time: price in USD of 1 unit of the crypto currency
+@dataclass(frozen=True)
+class RateSnapshot:
+    currency: str
+    rate: Decimal
+    fetched_at: float # Unix timestamp
+
+    @property
+    def fetched_at_datetime(self):
+        return datetime.fromtimestamp(self.fetched_at, tz=dt_timezone.utc)
+
+# --- PROVIDERS ---
+
+# Base class: a provider returns the USD price of 1 unit of a currency
+class RateProvider:
+    def fetch_rate(self, currency):
+        raise NotImplementedError
+
+# Fixed rates from settings.CRYPTO_FIXTURE_RATES (local development and tests)
+class FixtureRateProvider(RateProvider):
+    def fetch_rate(self, currency):
+        try:
+            return Decimal(str(settings.CRYPTO_FIXTURE_RATES[currency]))
+        except KeyError:
+            raise RateUnavailable(f"No fixture rate for {currency}")
+
+# Live rates from the public CoinGecko API
+class CoinGeckoRateProvider(RateProvider):
+    URL = "https://api.coingecko.com/api/v3/simple/price?ids={coin}&vs_currencies=usd"
+    COIN_IDS = {'BTC': 'bitcoin', 'ETH': 'ethereum', 'USDT': 'tether', 'USDC': 'usd-coin'}
+
+    def fetch_rate(self, currency):
+        coin = self.COIN_IDS.get(currency)
+        if coin is None:
+            raise RateUnavailable(f"Unsupported currency {currency}")
+        try:
+            with urllib.request.urlopen(self.URL.format(coin=coin), timeout=settings.CRYPTO_RATE_FETCH_TIMEOUT) as response:
+                data = json.load(response)
+            return Decimal(str(data[coin]['usd']))
+        except (OSError, ValueError, KeyError, TypeError, InvalidOperation) as exc: # Network error or malformed payload
+            raise RateUnavailable(f"Could not fetch {currency} rate: {exc}")
+
+_provider = None
+
+def get_rate_provider():
+    global _provider
+    if _provider is None:
+        _provider = import_string(settings.CRYPTO_RATE_PROVIDER)()
+    return _provider
+
+# --- CACHE ---
+
+# Rates already seen by this process (avoids a shared-cache round trip on every payment)
+_local_rates = {}
+# Currencies being refreshed in the background by this process
+_refreshing = set()
+_lock = threading.Lock()
+
+def _cache_key(currency):
+    return f"crypto_rate:{currency}"
+
+# Fetch a rate from the provider and store it in both cache levels
+def _refresh(currency):
+    rate = get_rate_provider().fetch_rate(currency)
+    if not rate.is_finite() or rate <= 0: # NaN would make the comparison itself raise
+        raise RateUnavailable(f"Invalid {currency} rate: {rate}")
+    snapshot = RateSnapshot(currency, rate, time.time())
+    # Kept in the shared cache until the stale window is over
+    cache.set(_cache_key(currency), (str(snapshot.rate), snapshot.fetched_at),
+              settings.CRYPTO_RATE_TTL + settings.CRYPTO_RATE_STALE_TTL)
+    with _lock:
+        _local_rates[currency] = snapshot
+    return snapshot
+
+# Only one caller (thread or process) fetches a given currency at a time
+def _acquire_refresh_lock(currency):
+    return cache.add(_cache_key(currency) + ':refreshing', True, settings.CRYPTO_RATE_FETCH_TIMEOUT * 2)
+
+def _release_refresh_lock(currency):
+    cache.delete(_cache_key(currency) + ':refreshing')
+
+def _refresh_in_background(currency):
+    with _lock:
+        if currency in _refreshing:
+            return
+        _refreshing.add(currency)
+    if not _acquire_refresh_lock(currency):
+        with _lock:
+            _refreshing.discard(currency)
+        return
+
+    def run():
+        try:
+            _refresh(currency)
+        except RateUnavailable:
+            pass # The current value keeps being served until the stale window is over
+        finally:
+            _release_refresh_lock(currency)
+            with _lock:
+                _refreshing.discard(currency)
+
+    threading.Thread(target=run, daemon=True).start()
+
+# Most recent known rate: in-process first, then the shared cache
+def _cached_snapshot(currency, now):
+    with _lock:
+        snapshot = _local_rates.get(currency)
+    if snapshot is not None and now - snapshot.fetched_at < settings.CRYPTO_RATE_TTL * settings.CRYPTO_RATE_REFRESH_AHEAD:
+        return snapshot
+
+    shared = cache.get(_cache_key(currency))
+    if shared is not None and (snapshot is None or shared[1] > snapshot.fetched_at):
+        snapshot = RateSnapshot(currency, Decimal(shared[0]), shared[1])
+        with _lock:
+            _local_rates[currency] = snapshot
+    return snapshot
+
+# True if the snapshot can still be served (fresh or within the stale window)
+def _is_usable(snapshot, now):
+    return snapshot is not None and now - snapshot.fetched_at < settings.CRYPTO_RATE_TTL + settings.CRYPTO_RATE_STALE_TTL
+
+# Synchronous fetch with a single flight: the caller holding the refresh lock calls the provider,
+# the others wait for its result instead of calling the provider too.
+def _fetch_now(currency):
+    if _acquire_refresh_lock(currency):
+        try:
+            return _refresh(currency)
+        finally:
+            _release_refresh_lock(currency)
+
+    deadline = time.time() + settings.CRYPTO_RATE_FETCH_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(settings.CRYPTO_RATE_WAIT_INTERVAL)
+        now = time.time()
+        snapshot = _cached_snapshot(currency, now)
+        if _is_usable(snapshot, now):
+            return snapshot
+        if cache.get(_cache_key(currency) + ':refreshing') is None:
+            break # The fetch failed
+    raise RateUnavailable(f"Could not get a {currency} rate")
+
+# Current USD rate of a crypto currency.
+# - fresh: returned as is
+# - past the refresh-ahead point: returned, and refreshed in the background
+# - expired but within the stale window: returned (stale-while-revalidate), and refreshed in the background
+# - missing or too old: fetched synchronously (once for all concurrent callers)
+def get_rate(currency):
+    if currency not in settings.CRYPTO_CURRENCIES:
+        raise RateUnavailable(f"Unsupported currency {currency}")
+
+    now = time.time()
+    snapshot = _cached_snapshot(currency, now)
+    if _is_usable(snapshot, now):
+        if now - snapshot.fetched_at >= settings.CRYPTO_RATE_TTL * settings.CRYPTO_RATE_REFRESH_AHEAD:
+            _refresh_in_background(currency)
+        return snapshot
+
+    return _fetch_now(currency)
@@ -0,0 +1,137 @@
+import heapq
+from collections import Counter, defaultdict
+from itertools import groupby, permutations
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max
+
+from .models import Product, OrderItem, ArchivedOrderItem, ProductCooccurrence
+
+# Top-K products bought together with a product, read from the precomputed index
+def get_related_products(product_id, limit=None):
+    if limit is None:
+        limit = settings.RELATED_PRODUCTS_LIMIT
+    return (
+        ProductCooccurrence.objects.filter(product_id=product_id)
+        .select_related('related_product')
+        .order_by('-count')[:limit]
+    )
+
+# Incremental update: add one order's products to the index (called by createOrder).
+# Missing pairs are inserted with count=0 first, then every pair is incremented by a single
+# UPDATE, so concurrent orders never lose a count when they both create the same pair.
+def record_order(product_ids):
+    product_ids = set(product_ids)
+    if len(product_ids) < 2:
+        return
+
+    with transaction.atomic():
+        pairs = ProductCooccurrence.objects.filter(product_id__in=product_ids, related_product_id__in=product_ids)
+        existing = set(pairs.values_list('product_id', 'related_product_id'))
+        ProductCooccurrence.objects.bulk_create(
+            [
+                ProductCooccurrence(product_id=a, related_product_id=b, count=0)
+                for a, b in permutations(product_ids, 2)
+                if (a, b) not in existing
+            ],
+            ignore_conflicts=True,
+        )
+        pairs.update(count=F('count') + 1)
+
+# Keep only the COOCCURRENCE_KEEP_PER_PRODUCT best pairs of every product (run periodically).
+# The index only needs the top K per product; the extra rows above K leave room for
+# incremental updates to promote a product before the next trim or rebuild.
+# Returns the number of deleted pairs.
+def trim_cooccurrence(keep=None):
+    if keep is None:
+        keep = settings.COOCCURRENCE_KEEP_PER_PRODUCT
+
+    deleted = 0
+    oversized = (
+        ProductCooccurrence.objects.values('product_id')
+        .annotate(n=Count('id'))
+        .filter(n__gt=keep)
+        .values_list('product_id', flat=True)
+    )
+    for product_id in list(oversized):
+        extra_ids = list(
+            ProductCooccurrence.objects.filter(product_id=product_id)
+            .order_by('-count', 'id')
+            .values_list('id', flat=True)[keep:]
+        )
+        deleted += ProductCooccurrence.objects.filter(id__in=extra_ids).delete()[0]
+    return deleted
+
+# Pair counts for the products with product_lo <= product_id < product_hi,
+# in the orders with order_lo <= order_id < order_hi, grouped by the database
+def _count_pairs(item_model, product_lo, product_hi, order_lo, order_hi):
+    rows = (
+        item_model.objects.filter(
+            product_id__gte=product_lo, product_id__lt=product_hi,
+            order_id__gte=order_lo, order_id__lt=order_hi,
+        )
+        .values('product_id', related_id=F('order__items__product_id'))
+        .annotate(n=Count('order_id', distinct=True))
+        .order_by()
+    )
+    return {(r['product_id'], r['related_id']): r['n'] for r in rows if r['product_id'] != r['related_id']}
+
+# Re-apply record_order for the orders created after `after_order_id` (their increments are wiped by the swap)
+def _replay_orders_after(after_order_id):
+    lines = (
+        OrderItem.objects.filter(order_id__gt=after_order_id)
+        .order_by('order_id')
+        .values_list('order_id', 'product_id')
+    )
+    for _, order_lines in groupby(lines.iterator(), key=itemgetter(0)):
+        record_order(product_id for _, product_id in order_lines)
+
+# Full rebuild from every order line (live and archived).
+# Products are handled one id range at a time (product_chunk_size), and for each range the orders are
+# counted one id range at a time (chunk_size). Only the top `keep` pairs of each product are kept in
+# memory, so memory grows with keep x catalog size, not with the number of distinct pairs in the history.
+# The new rows replace the index in one transaction at the end. record_order increments committed during
+# the recount are wiped by that swap, so the orders created since the start of the rebuild are replayed
+# in the same transaction. (Orders still being created when the rebuild starts or ends may be counted twice.)
+# Returns the number of product pairs in the new index.
+def rebuild_cooccurrence(chunk_size=None, keep=None, product_chunk_size=None):
+    if chunk_size is None:
+        chunk_size = settings.COOCCURRENCE_REBUILD_CHUNK_SIZE
+    if keep is None:
+        keep = settings.COOCCURRENCE_KEEP_PER_PRODUCT
+    if product_chunk_size is None:
+        product_chunk_size = settings.COOCCURRENCE_REBUILD_PRODUCT_CHUNK_SIZE
+
+    # Orders created after this point are replayed after the swap instead of being counted
+    max_order_ids = {
+        item_model: item_model.objects.aggregate(m=Max('order_id'))['m'] or 0
+        for item_model in (OrderItem, ArchivedOrderItem)
+    }
+    max_product_id = Product.objects.aggregate(m=Max('id'))['m'] or 0
+
+    rows = []
+    for product_lo in range(0, max_product_id + 1, product_chunk_size):
+        product_hi = product_lo + product_chunk_size
+        counts = Counter()
+        for item_model, max_order_id in max_order_ids.items():
+            for order_lo in range(0, max_order_id + 1, chunk_size):
+                order_hi = min(order_lo + chunk_size, max_order_id + 1)
+                counts.update(_count_pairs(item_model, product_lo, product_hi, order_lo, order_hi))
+
+        by_product = defaultdict(list)
+        for (a, b), n in counts.items():
+            by_product[a].append((n, b))
+        rows.extend(
+            ProductCooccurrence(product_id=a, related_product_id=b, count=n)
+            for a, related in by_product.items()
+            for n, b in heapq.nlargest(keep, related)
+        )
+
+    with transaction.atomic():
+        ProductCooccurrence.objects.all().delete()
+        ProductCooccurrence.objects.bulk_create(rows, batch_size=chunk_size)
+        _replay_orders_after(max_order_ids[OrderItem])
+
+    return len(rows)
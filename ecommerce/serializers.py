@@ -1,6 +1,10 @@
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
 from rest_framework import serializers
-from .models import Product, User, Cart, Order, CartItem, OrderItem, CryptoPayment
+from .models import (
+    Product, User, Cart, Order, CartItem, OrderItem, CryptoPayment,
+    ArchivedOrder, ArchivedOrderItem, ProductCooccurrence
+)
 
 # Serializer for the Product model
 class ProductSerializer(serializers.ModelSerializer):
@@ -8,6 +12,15 @@ class ProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = '__all__' # Expose all fields of the model
 
+# Serializer for a "frequently bought together" entry
+class RelatedProductSerializer(serializers.ModelSerializer):
+    product = ProductSerializer(source='related_product', read_only=True)
+    bought_together = serializers.IntegerField(source='count', read_only=True) # Number of shared orders
+
+    class Meta:
+        model = ProductCooccurrence
+        fields = ['product', 'bought_together']
+
 # Serializer for displaying user information (Read-only)
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -72,8 +85,26 @@ class OrderSerializer(serializers.ModelSerializer):
 
 # Serializer for cryptocurrency payments
 class CryptoPaymentSerializer(serializers.ModelSerializer):
+    crypto_currency = serializers.ChoiceField(choices=settings.CRYPTO_CURRENCIES, default='USDT')
+
     class Meta:
         model = CryptoPayment
         fields = '__all__'
-        read_only_fields = ['id', 'order', 'crypto_amount', 'crypto_currency', 'transaction_hash', 'is_confirmed', 'created_at'] # Auto-handled
-    
+        read_only_fields = ['id', 'order', 'crypto_amount', 'exchange_rate', 'rate_fetched_at', 'transaction_hash', 'is_confirmed', 'created_at'] # Auto-handled
+
+# Serializer for items of an archived order
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+
+    class Meta:
+        model = ArchivedOrderItem
+        fields = ['id', 'product', 'product_name', 'quantity', 'price']
+
+# Serializer for archived orders (same shape as OrderSerializer, plus the archival date)
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ArchivedOrder
+        fields = ['id', 'user', 'items', 'total_price', 'status', 'payment_method', 'date_created', 'archived_at']
+        read_only_fields = fields
@@ -1,3 +1,489 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .archive import archive_orders, get_archive_cutoff, order_to_dict
+from . import rates, recommendations, throttles
+from .recommendations import record_order, rebuild_cooccurrence, trim_cooccurrence
+from .models import (
+    User, Product, Order, OrderItem, CryptoPayment, CartItem,
+    ArchivedOrder, ArchivedOrderItem, ArchivedCryptoPayment, ProductCooccurrence
+)
+
+
+# Create an order with one line per product, optionally backdated
+def make_order(user, products, status='pending', days_ago=0):
+    order = Order.objects.create(user=user, total_price=sum(p.price for p in products), status=status)
+    for product in products:
+        OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+    if days_ago:
+        Order.objects.filter(id=order.id).update(date_created=timezone.now() - timedelta(days=days_ago))
+        order.refresh_from_db()
+    return order
+
+
+# --- ARCHIVE ---
+
+class ArchiveOrdersTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(username='alice', email='alice@example.com', hashedPassword='x')
+        self.product = Product.objects.create(name='Book', price=Decimal('10.00'), stock=100)
+        self.old_shipped = make_order(self.user, [self.product], status='shipped', days_ago=400)
+        self.old_cancelled = make_order(self.user, [self.product], status='cancelled', days_ago=400)
+        self.old_pending = make_order(self.user, [self.product], status='pending', days_ago=400)
+        self.recent_shipped = make_order(self.user, [self.product], status='shipped')
+        CryptoPayment.objects.create(order=self.old_shipped, wallet_address='wallet', crypto_amount=Decimal('10'))
+        self.export_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.export_dir.cleanup)
+
+    def test_moves_old_finished_orders_only(self):
+        archived, _ = archive_orders(get_archive_cutoff(180), chunk_size=1)
+
+        self.assertEqual(archived, 2)
+        self.assertEqual(
+            set(ArchivedOrder.objects.values_list('id', flat=True)),
+            {self.old_shipped.id, self.old_cancelled.id},
+        )
+        self.assertEqual(ArchivedOrderItem.objects.count(), 2)
+        self.assertEqual(ArchivedCryptoPayment.objects.get().order_id, self.old_shipped.id)
+        self.assertEqual(
+            set(Order.objects.values_list('id', flat=True)),
+            {self.old_pending.id, self.recent_shipped.id},
+        )
+        self.assertFalse(CryptoPayment.objects.exists())
+
+    def test_export_contains_archived_orders(self):
+        archived, export_path = archive_orders(get_archive_cutoff(180), chunk_size=1, export_dir=self.export_dir.name)
+
+        with gzip.open(export_path, 'rt', encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line['id'] for line in lines], [self.old_shipped.id, self.old_cancelled.id])
+        self.assertEqual(lines[0]['items'][0]['product'], self.product.id)
+        self.assertEqual(lines[0]['crypto_payment']['wallet_address'], 'wallet')
+        self.assertIsNone(lines[1]['crypto_payment'])
+
+    def test_runs_never_overwrite_previous_exports(self):
+        _, first = archive_orders(get_archive_cutoff(180), export_dir=self.export_dir.name)
+        make_order(self.user, [self.product], status='shipped', days_ago=400)
+        _, second = archive_orders(get_archive_cutoff(180), export_dir=self.export_dir.name)
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(len(list(Path(self.export_dir.name).iterdir())), 2)
+
+    def test_no_export_file_when_nothing_archived(self):
+        archived, export_path = archive_orders(get_archive_cutoff(1000), export_dir=self.export_dir.name)
+
+        self.assertEqual(archived, 0)
+        self.assertIsNone(export_path)
+        self.assertEqual(list(Path(self.export_dir.name).iterdir()), [])
+
+    def test_get_orders_reads_archive_only_when_asked(self):
+        archive_orders(get_archive_cutoff(180))
+
+        response = self.client.get(f'/eshop/orders/{self.user.id}/')
+        self.assertEqual({o['id'] for o in response.json()}, {self.old_pending.id, self.recent_shipped.id})
+
+        response = self.client.get(f'/eshop/orders/{self.user.id}/?include_archived=true')
+        self.assertEqual(
+            {o['id'] for o in response.json()},
+            {self.old_pending.id, self.recent_shipped.id, self.old_shipped.id, self.old_cancelled.id},
+        )
+
+
+# --- RECOMMENDATIONS ---
+
+class CooccurrenceTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(username='alice', email='alice@example.com', hashedPassword='x')
+        self.a, self.b, self.c, self.d = [
+            Product.objects.create(name=name, price=Decimal('5.00'), stock=100) for name in 'abcd'
+        ]
+
+    def pair_counts(self):
+        return {
+            (p, r): n for p, r, n in ProductCooccurrence.objects.values_list('product_id', 'related_product_id', 'count')
+        }
+
+    def test_create_order_updates_index(self):
+        for products in ([self.a, self.b, self.c], [self.a, self.b], [self.a, self.d]):
+            for product in products:
+                CartItem.objects.create(cart=self.user.cart, product=product, quantity=1)
+            self.assertEqual(self.client.post(f'/eshop/orders/{self.user.id}/create/').status_code, 201)
+
+        response = self.client.get(f'/eshop/products/{self.a.id}/related/')
+        self.assertEqual(response.status_code, 200)
+        related = [(r['product']['id'], r['bought_together']) for r in response.json()]
+        self.assertEqual(related[0], (self.b.id, 2))
+        self.assertEqual(sorted(related[1:]), sorted([(self.c.id, 1), (self.d.id, 1)]))
+
+    def test_record_order_counts_existing_and_new_pairs_once(self):
+        record_order([self.a.id, self.b.id])
+        record_order([self.a.id, self.b.id, self.c.id])
+
+        counts = self.pair_counts()
+        self.assertEqual(counts[(self.a.id, self.b.id)], 2)
+        self.assertEqual(counts[(self.b.id, self.a.id)], 2)
+        self.assertEqual(counts[(self.a.id, self.c.id)], 1)
+        self.assertEqual(counts[(self.c.id, self.b.id)], 1)
+
+    def test_rebuild_matches_incremental_counts(self):
+        for products in ([self.a, self.b, self.c], [self.a, self.b], [self.c, self.d]):
+            make_order(self.user, products)
+            record_order(p.id for p in products)
+        incremental = self.pair_counts()
+
+        rebuild_cooccurrence(chunk_size=1)
+
+        self.assertEqual(self.pair_counts(), incremental)
+
+    def test_rebuild_partitioned_by_product_matches_single_pass(self):
+        for products in ([self.a, self.b, self.c], [self.a, self.b], [self.c, self.d], [self.a, self.d]):
+            make_order(self.user, products)
+
+        rebuild_cooccurrence()
+        single_pass = self.pair_counts()
+        rebuild_cooccurrence(chunk_size=1, product_chunk_size=1)
+
+        self.assertEqual(self.pair_counts(), single_pass)
+
+    def test_orders_created_during_rebuild_are_kept(self):
+        make_order(self.user, [self.a, self.b])
+        count_pairs = recommendations._count_pairs
+        created = []
+
+        # An order is created (and recorded) while the rebuild is counting
+        def count_pairs_with_concurrent_order(*args):
+            if not created:
+                created.append(make_order(self.user, [self.a, self.b, self.c]))
+                record_order([self.a.id, self.b.id, self.c.id])
+            return count_pairs(*args)
+
+        with mock.patch('ecommerce.recommendations._count_pairs', count_pairs_with_concurrent_order):
+            rebuild_cooccurrence()
+
+        counts = self.pair_counts()
+        self.assertEqual(counts[(self.a.id, self.b.id)], 2)
+        self.assertEqual(counts[(self.a.id, self.c.id)], 1)
+
+    def test_rebuild_and_trim_keep_top_pairs_per_product(self):
+        make_order(self.user, [self.a, self.b, self.c, self.d])
+        make_order(self.user, [self.a, self.b])
+        make_order(self.user, [self.a, self.c])
+
+        rebuild_cooccurrence(keep=2)
+        kept = ProductCooccurrence.objects.filter(product=self.a).values_list('related_product_id', flat=True)
+        self.assertEqual(set(kept), {self.b.id, self.c.id})
+
+        # Adds a->d and d->a back: both products go over the limit again
+        record_order([self.a.id, self.d.id])
+        self.assertEqual(trim_cooccurrence(keep=2), 2)
+        self.assertEqual(ProductCooccurrence.objects.filter(product=self.a).count(), 2)
+        self.assertEqual(ProductCooccurrence.objects.filter(product=self.d).count(), 2)
+
+    def test_related_unknown_product(self):
+        self.assertEqual(self.client.get('/eshop/products/999/related/').status_code, 404)
+
+
+# --- EXPORTS ---
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.alice = User.objects.create(username='alice', email='alice@example.com', hashedPassword='x')
+        self.bob = User.objects.create(username='bob', email='bob@example.com', hashedPassword='x')
+        self.book, self.pen = [
+            Product.objects.create(name=name, price=Decimal('4.00'), stock=100) for name in ('Book', 'Pen')
+        ]
+        self.old = make_order(self.alice, [self.book, self.pen], status='shipped', days_ago=30)
+        self.recent = make_order(self.alice, [self.book])
+        self.other = make_order(self.bob, [self.pen])
+        CryptoPayment.objects.create(order=self.recent, wallet_address='wallet', crypto_amount=Decimal('4'),
+                                     exchange_rate=Decimal('1'))
+
+    def download(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        return gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+
+    def test_user_csv_export(self):
+        rows = list(csv.DictReader(io.StringIO(self.download(f'/eshop/orders/{self.alice.id}/export/'))))
+
+        self.assertEqual([int(r['order_id']) for r in rows], [self.old.id, self.old.id, self.recent.id])
+        self.assertEqual({int(r['product_id']) for r in rows if int(r['order_id']) == self.old.id},
+                         {self.book.id, self.pen.id})
+        self.assertEqual(rows[2]['crypto_currency'], 'USDT')
+        self.assertEqual(rows[0]['crypto_currency'], '')
+
+    def test_admin_ndjson_export_with_date_bounds(self):
+        today = timezone.now().date()
+        lines = self.download(f'/eshop/admin/orders/export/?export_format=ndjson&date_from={today}&date_to={today}')
+        orders = [json.loads(line) for line in lines.splitlines()]
+
+        self.assertEqual([o['id'] for o in orders], [self.recent.id, self.other.id])
+        self.assertEqual(orders[0]['crypto_payment']['exchange_rate'], '1.00000000')
+
+        day = (timezone.now() - timedelta(days=30)).date()
+        lines = self.download(f'/eshop/admin/orders/export/?export_format=ndjson&date_to={day}')
+        self.assertEqual([json.loads(line)['id'] for line in lines.splitlines()], [self.old.id])
+
+    def test_export_includes_archived_orders_when_asked(self):
+        archive_orders(get_archive_cutoff(7))
+
+        lines = self.download('/eshop/admin/orders/export/?export_format=ndjson').splitlines()
+        self.assertNotIn(self.old.id, [json.loads(line)['id'] for line in lines])
+
+        lines = self.download('/eshop/admin/orders/export/?export_format=ndjson&include_archived=true').splitlines()
+        self.assertIn(self.old.id, [json.loads(line)['id'] for line in lines])
+
+    def test_ndjson_uses_archive_schema(self):
+        lines = self.download(f'/eshop/orders/{self.alice.id}/export/?export_format=ndjson').splitlines()
+        orders = {o['id']: o for o in map(json.loads, lines)}
+
+        self.recent.refresh_from_db()
+        self.assertEqual(orders[self.recent.id], json.loads(json.dumps(order_to_dict(self.recent))))
+        self.assertEqual(orders[self.recent.id]['crypto_payment']['wallet_address'], 'wallet')
+
+    def test_command_rejects_impossible_date(self):
+        with self.assertRaises(CommandError):
+            call_command('export_orders', str(Path(tempfile.gettempdir()) / 'orders.csv.gz'), '--from', '2024-02-30')
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/eshop/admin/orders/export/?date_from=yesterday').status_code, 400)
+        response = self.client.get(f'/eshop/orders/{self.alice.id}/export/?date_from=2024-02-30')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "date_from must be a date (YYYY-MM-DD)"})
+        self.assertEqual(self.client.get('/eshop/admin/orders/export/?date_to=2024-13-01').status_code, 400)
+        self.assertEqual(self.client.get('/eshop/admin/orders/export/?export_format=xml').status_code, 400)
+        self.assertEqual(self.client.get('/eshop/orders/999/export/').status_code, 404)
+
+
+# --- EXCHANGE RATES ---
+
+# Fixture provider counting its calls
+class CountingRateProvider(rates.FixtureRateProvider):
+    calls = 0
+
+    def fetch_rate(self, currency):
+        CountingRateProvider.calls += 1
+        return super().fetch_rate(currency)
+
+class FailingRateProvider(rates.RateProvider):
+    def fetch_rate(self, currency):
+        raise rates.RateUnavailable("provider down")
+
+class ZeroRateProvider(rates.RateProvider):
+    def fetch_rate(self, currency):
+        return Decimal('0')
+
+class NanRateProvider(rates.RateProvider):
+    def fetch_rate(self, currency):
+        return Decimal('NaN')
+
+# Runs "background" threads synchronously so the refresh can be checked right away
+class ImmediateThread:
+    def __init__(self, target, daemon=None):
+        self.target = target
+
+    def start(self):
+        self.target()
+
+@override_settings(
+    CRYPTO_RATE_PROVIDER='ecommerce.tests.CountingRateProvider',
+    CRYPTO_FIXTURE_RATES={'USDT': '1', 'USDC': '1', 'BTC': '50000', 'ETH': '2500'},
+    CRYPTO_RATE_TTL=60, CRYPTO_RATE_REFRESH_AHEAD=0.8, CRYPTO_RATE_STALE_TTL=300,
+    CRYPTO_RATE_FETCH_TIMEOUT=1, CRYPTO_RATE_WAIT_INTERVAL=0.01,
+)
+class ExchangeRateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.reset_rates()
+        self.addCleanup(self.reset_rates)
+        self.user = User.objects.create(username='alice', email='alice@example.com', hashedPassword='x')
+        self.product = Product.objects.create(name='Book', price=Decimal('100.00'), stock=100)
+
+    def reset_rates(self):
+        rates._provider = None
+        rates._local_rates.clear()
+        rates._refreshing.clear()
+        CountingRateProvider.calls = 0
+        cache.clear()
+
+    # Put a rate fetched `age` seconds ago in both cache levels
+    def seed_rate(self, currency, rate, age):
+        fetched_at = time.time() - age
+        rates._local_rates[currency] = rates.RateSnapshot(currency, Decimal(rate), fetched_at)
+        cache.set(rates._cache_key(currency), (rate, fetched_at), 3600)
+
+    def test_pay_with_btc_and_eth(self):
+        for currency, expected_amount, expected_rate in (('BTC', '0.00200000', '50000'), ('ETH', '0.04000000', '2500')):
+            order = make_order(self.user, [self.product])
+            response = self.client.post(f'/eshop/orders/{order.id}/pay-crypto/',
+                                        {'wallet_address': 'wallet', 'crypto_currency': currency})
+
+            self.assertEqual(response.status_code, 201)
+            payment = CryptoPayment.objects.get(order=order)
+            self.assertEqual(payment.crypto_currency, currency)
+            self.assertEqual(payment.crypto_amount, Decimal(expected_amount))
+            self.assertEqual(payment.exchange_rate, Decimal(expected_rate))
+            self.assertIsNotNone(payment.rate_fetched_at)
+
+    def test_fresh_rate_is_cached(self):
+        rates.get_rate('BTC')
+        rates.get_rate('BTC')
+        self.assertEqual(CountingRateProvider.calls, 1)
+
+    def test_refresh_ahead_starts_background_refresh(self):
+        self.seed_rate('BTC', '40000', age=50) # Past 0.8 * TTL, still fresh
+
+        with mock.patch('ecommerce.rates.threading.Thread', ImmediateThread):
+            snapshot = rates.get_rate('BTC')
+
+        self.assertEqual(snapshot.rate, Decimal('40000')) # Served from the cache
+        self.assertEqual(CountingRateProvider.calls, 1)
+        self.assertEqual(rates.get_rate('BTC').rate, Decimal('50000'))
+
+    def test_stale_rate_served_while_revalidating(self):
+        self.seed_rate('BTC', '40000', age=200) # Expired, within the stale window
+
+        with mock.patch('ecommerce.rates._refresh_in_background') as refresh:
+            snapshot = rates.get_rate('BTC')
+
+        self.assertEqual(snapshot.rate, Decimal('40000'))
+        refresh.assert_called_once_with('BTC')
+        self.assertEqual(CountingRateProvider.calls, 0)
+
+    def test_synchronous_fetch_after_stale_window(self):
+        self.seed_rate('BTC', '40000', age=400)
+
+        self.assertEqual(rates.get_rate('BTC').rate, Decimal('50000'))
+        self.assertEqual(CountingRateProvider.calls, 1)
+
+    def test_concurrent_cold_fetch_waits_for_the_running_one(self):
+        self.assertTrue(rates._acquire_refresh_lock('ETH')) # Another caller is fetching
+        threading.Timer(0.05, rates._refresh, args=['ETH']).start()
+
+        self.assertEqual(rates.get_rate('ETH').rate, Decimal('2500'))
+        self.assertEqual(CountingRateProvider.calls, 1) # Only the lock holder called the provider
+
+    @override_settings(CRYPTO_RATE_PROVIDER='ecommerce.tests.FailingRateProvider')
+    def test_provider_failure_returns_503(self):
+        order = make_order(self.user, [self.product])
+        response = self.client.post(f'/eshop/orders/{order.id}/pay-crypto/',
+                                    {'wallet_address': 'wallet', 'crypto_currency': 'BTC'})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(CryptoPayment.objects.exists())
+
+    @override_settings(CRYPTO_RATE_PROVIDER='ecommerce.tests.NanRateProvider')
+    def test_nan_rate_is_unavailable(self):
+        with self.assertRaises(rates.RateUnavailable):
+            rates.get_rate('BTC')
+
+    def test_coingecko_malformed_payload_is_unavailable(self):
+        provider = rates.CoinGeckoRateProvider()
+        for payload in (b'{"bitcoin": {"usd": null}}', b'{"bitcoin": {"usd": "n/a"}}', b'{"bitcoin": []}', b'[]'):
+            with mock.patch('ecommerce.rates.urllib.request.urlopen', return_value=io.BytesIO(payload)):
+                with self.assertRaises(rates.RateUnavailable):
+                    provider.fetch_rate('BTC')
+
+    @override_settings(CRYPTO_RATE_PROVIDER='ecommerce.tests.ZeroRateProvider')
+    def test_zero_rate_returns_503(self):
+        order = make_order(self.user, [self.product])
+        response = self.client.post(f'/eshop/orders/{order.id}/pay-crypto/',
+                                    {'wallet_address': 'wallet', 'crypto_currency': 'ETH'})
+
+        self.assertEqual(response.status_code, 503)
+
+
+# --- THROTTLING ---
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], # Keeps the tests fast
+    CONCURRENCY_LIMITS={'auth': 2, 'checkout': 2},
+)
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        self.addCleanup(cache.clear)
+        rates_patch = mock.patch.dict(
+            throttles.TokenBucketThrottle.THROTTLE_RATES,
+            {'auth': '3/min', 'login_account': '2/min', 'checkout': '3/min', 'checkout_user': '3/min'},
+        )
+        rates_patch.start()
+        self.addCleanup(rates_patch.stop)
+
+    def register(self, i, **extra):
+        return self.client.post('/eshop/register/', {
+            'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'password123',
+        }, **extra)
+
+    def test_429_with_retry_after_once_bucket_is_empty(self):
+        for i in range(3):
+            self.assertEqual(self.register(i).status_code, 201)
+
+        response = self.register(3)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20') # 3/min: one token every 20 s
+        self.assertFalse(User.objects.filter(email='user3@example.com').exists())
+
+    def test_spoofed_forwarded_for_is_ignored(self):
+        codes = [self.register(i, HTTP_X_FORWARDED_FOR=f'10.0.0.{i}').status_code for i in range(5)]
+        self.assertEqual(codes, [201, 201, 201, 429, 429])
+
+    def test_login_limited_per_account(self):
+        for ip in ('10.0.0.1', '10.0.0.2'):
+            response = self.client.post('/eshop/login/', {'email': 'victim@example.com', 'password': 'guess'},
+                                        REMOTE_ADDR=ip)
+            self.assertEqual(response.status_code, 404)
+
+        response = self.client.post('/eshop/login/', {'email': 'victim@example.com', 'password': 'guess'},
+                                    REMOTE_ADDR='10.0.0.3')
+        self.assertEqual(response.status_code, 429)
+
+    def test_login_with_non_object_body_is_rejected(self):
+        response = self.client.post('/eshop/login/', [1, 2], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_concurrency_cap_rejects_beyond_limit(self):
+        slots = [throttles._acquire_slot('auth', 2) for _ in range(2)] # Two requests still running
+        self.assertNotIn(None, slots)
+
+        response = self.register(0)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(User.objects.exists())
+
+        throttles._release_slot(slots[0])
+        self.assertEqual(self.register(0).status_code, 201)
+        # The slot taken by that request was released when it finished
+        self.assertIsNotNone(throttles._acquire_slot('auth', 2))
+
+    def test_expired_slot_is_not_released_by_its_former_owner(self):
+        slot = throttles._acquire_slot('auth', 1)
+        cache.delete(slot[0]) # The slot expires while its request is still running...
+        other = throttles._acquire_slot('auth', 1) # ...and another request takes it
+
+        throttles._release_slot(slot) # The first request finishes
+        self.assertIsNone(throttles._acquire_slot('auth', 1))
+
+        throttles._release_slot(other)
+        self.assertIsNotNone(throttles._acquire_slot('auth', 1))
@@ -0,0 +1,139 @@
+import functools
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.throttling import SimpleRateThrottle
+
+# --- RATE LIMITS (token bucket) ---
+
+# Token bucket throttle with its state in the Django cache.
+# A rate of 'N/period' gives a bucket of N tokens refilled at N tokens per period:
+# bursts of up to N requests are accepted, then requests are spread over the period.
+class TokenBucketThrottle(SimpleRateThrottle):
+    cache_format = 'throttle_bucket_%(scope)s_%(ident)s'
+    # The bucket update (read, refill, take a token, write) runs under a short cache.add lock,
+    # so concurrent requests of one client cannot all spend the same token
+    lock_timeout = 2
+    lock_attempts = 20
+    lock_wait = 0.005
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        lock_key = self.key + '_lock'
+        for _ in range(self.lock_attempts):
+            if self.cache.add(lock_key, True, self.lock_timeout):
+                break
+            time.sleep(self.lock_wait)
+        else:
+            # Still busy: this client is sending a burst of concurrent requests
+            self.retry_after = 1
+            return False
+
+        try:
+            return self._take_token()
+        finally:
+            self.cache.delete(lock_key)
+
+    def _take_token(self):
+        now = self.timer()
+        refill_rate = self.num_requests / self.duration # Tokens per second
+        tokens, last = self.cache.get(self.key, (self.num_requests, now))
+        tokens = min(self.num_requests, tokens + (now - last) * refill_rate)
+
+        if tokens >= 1:
+            self.cache.set(self.key, (tokens - 1, now), self.duration)
+            return True
+
+        # Time until the next token is available (used for Retry-After)
+        self.retry_after = (1 - tokens) / refill_rate
+        self.cache.set(self.key, (tokens, now), self.duration)
+        return False
+
+    def wait(self):
+        return getattr(self, 'retry_after', None)
+
+# Per client (IP address) limit on login and register
+class AuthClientThrottle(TokenBucketThrottle):
+    scope = 'auth'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+# Per account limit on login (protects one account against password guessing from many clients)
+class LoginAccountThrottle(TokenBucketThrottle):
+    scope = 'login_account'
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email') if isinstance(request.data, dict) else None
+        if not email:
+            return None # Rejected by the serializer anyway
+        return self.cache_format % {'scope': self.scope, 'ident': str(email).lower()}
+
+# Per client (IP address) limit on order creation
+class CheckoutClientThrottle(TokenBucketThrottle):
+    scope = 'checkout'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+# Per user limit on order creation
+class CheckoutUserThrottle(TokenBucketThrottle):
+    scope = 'checkout_user'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': view.kwargs.get('userId')}
+
+# --- CONCURRENCY CAP ---
+
+# Take one of the `limit` slots of a concurrency cap. Every slot is its own cache key with its own
+# expiry (CONCURRENCY_SLOT_TIMEOUT, which recovers slots of killed workers), taken with the atomic
+# cache.add. The slot holds a token unique to the request, so only its owner can release it.
+# Returns (slot key, token), or None when all slots are in use.
+def _acquire_slot(name, limit):
+    token = secrets.token_hex(8)
+    for i in range(limit):
+        key = f"concurrency_{name}_{i}"
+        if cache.add(key, token, settings.CONCURRENCY_SLOT_TIMEOUT):
+            return key, token
+    return None
+
+# Release a slot, unless it expired and was taken by another request in the meantime
+def _release_slot(slot):
+    key, token = slot
+    if cache.get(key) == token:
+        cache.delete(key)
+
+# Limit the number of requests running the decorated view at the same time (across all workers
+# sharing the cache). Extra requests get an immediate 429 before any expensive work is done.
+# Place it below @api_view so the cheaper rate limits are checked first.
+def limit_concurrency(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(request, *args, **kwargs):
+            limit = settings.CONCURRENCY_LIMITS.get(name)
+            if limit is None:
+                return func(request, *args, **kwargs)
+
+            slot = _acquire_slot(name, limit)
+            if slot is None:
+                return Response(
+                    {"detail": "Server busy, please retry later."},
+                    status=status.HTTP_429_TOO_MANY_REQUESTS,
+                    headers={'Retry-After': str(settings.CONCURRENCY_RETRY_AFTER)},
+                )
+            try:
+                return func(request, *args, **kwargs)
+            finally:
+                _release_slot(slot)
+        return wrapper
+    return decorator
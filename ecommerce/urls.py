@@ -9,11 +9,13 @@ urlpatterns = [
     # PRODUCTS (PUBLIC)
     path('products/', views.getAllProducts, name='get_products'),
     path('products/<int:productId>/', views.getProduct, name='get_product'),
+    path('products/<int:productId>/related/', views.getRelatedProducts, name='get_related_products'),
 
     # ADMIN / MANAGEMENT
     path('admin/products/create/', views.createProduct, name='admin_create_product'),
     path('admin/products/<int:productId>/update/', views.updateProduct, name='admin_update_product'),
     path('admin/products/<int:productId>/delete/', views.deleteProduct, name='admin_delete_product'),
+    path('admin/orders/export/', views.exportAllOrders, name='admin_export_orders'),
 
     # CART (USER)
     path('cart/<int:userId>/', views.getCart, name='get_cart'),
@@ -24,6 +26,7 @@ urlpatterns = [
     # ORDERS & PAYMENTS
     path('orders/<int:userId>/', views.getOrders, name='get_orders'),
     path('orders/<int:userId>/create/', views.createOrder, name='create_order'),
+    path('orders/<int:userId>/export/', views.exportUserOrders, name='export_orders'),
     path('orders/<int:orderId>/pay-crypto/', views.payWithCrypto, name='pay_crypto'),
     path('orders/<int:orderId>/confirm-crypto/', views.confirmCryptoPayment, name='confirm_crypto'),
 ]
@@ -1,15 +1,25 @@
 from drf_spectacular.utils import extend_schema, OpenApiParameter
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, throttle_classes
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Product, User, Cart, Order, CartItem, OrderItem, CryptoPayment
+from .models import Product, User, Cart, Order, CartItem, OrderItem, CryptoPayment, ArchivedOrder
 from .serializers import (
     ProductSerializer, UserSerializer, CartSerializer, CartItemSerializer, 
-    OrderSerializer, RegisterSerializer, LoginSerializer, CryptoPaymentSerializer
+    OrderSerializer, RegisterSerializer, LoginSerializer, CryptoPaymentSerializer,
+    ArchivedOrderSerializer, RelatedProductSerializer
+)
+from .recommendations import get_related_products, record_order
+from .exports import EXPORT_FORMATS, export_querysets, iter_orders, export_orders
+from .rates import get_rate, RateUnavailable
+from .throttles import (
+    AuthClientThrottle, LoginAccountThrottle, CheckoutClientThrottle, CheckoutUserThrottle,
+    limit_concurrency
 )
 from django.contrib.auth.hashers import check_password
 from django.shortcuts import get_object_or_404
-from decimal import Decimal
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from decimal import Decimal, ROUND_UP
 import secrets # For generating secure random transaction hashes
 
 # --- AUTHENTICATION ---
@@ -17,6 +27,8 @@ import secrets # For generating secure random transaction hashes
 # Registration of a new user
 @extend_schema(request=RegisterSerializer)
 @api_view(['POST'])
+@throttle_classes([AuthClientThrottle])
+@limit_concurrency('auth')
 def register(request):
     serializer = RegisterSerializer(data=request.data)
     if serializer.is_valid():
@@ -27,6 +39,8 @@ def register(request):
 # User Login
 @extend_schema(request=LoginSerializer)
 @api_view(['POST'])
+@throttle_classes([AuthClientThrottle, LoginAccountThrottle])
+@limit_concurrency('auth')
 def login(request):
     serializer = LoginSerializer(data=request.data)
     if not serializer.is_valid():
@@ -63,6 +77,14 @@ def getProduct(request, productId):
     serializer = ProductSerializer(product)
     return Response(serializer.data)
 
+# Products frequently bought together with a product (read from the precomputed index)
+@extend_schema(responses={200: RelatedProductSerializer(many=True)})
+@api_view(['GET'])
+def getRelatedProducts(request, productId):
+    get_object_or_404(Product, id=productId)
+    serializer = RelatedProductSerializer(get_related_products(productId), many=True)
+    return Response(serializer.data)
+
 # Create a new product (Admin)
 @extend_schema(request=ProductSerializer)
 @api_view(['POST'])
@@ -140,6 +162,8 @@ def clearCart(request, userId):
 
 # Convert cart into an order and deduct stock
 @api_view(['POST'])
+@throttle_classes([CheckoutClientThrottle, CheckoutUserThrottle])
+@limit_concurrency('checkout')
 def createOrder(request, userId):
     user = get_object_or_404(User, id=userId)
     cart = get_object_or_404(Cart, user=user)
@@ -182,19 +206,80 @@ def createOrder(request, userId):
             price=oi['price']
         )
     
-    # 5. Clear cart after successful order creation
+    # 5. Update the "frequently bought together" index
+    record_order(oi['product'].id for oi in order_items_to_create)
+
+    # 6. Clear cart after successful order creation
     cart.items.all().delete()
     
     return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
 
-# See all orders for a user
+# See all orders for a user (archived orders are only read when explicitly requested)
+@extend_schema(
+    parameters=[
+        OpenApiParameter(name='include_archived', type=bool, required=False,
+                         description="Also return orders moved to the archive")
+    ]
+)
 @api_view(['GET'])
 def getOrders(request, userId):
     orders = Order.objects.filter(user_id=userId)
-    serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data)
+    data = OrderSerializer(orders, many=True).data
+
+    if request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes'):
+        archived = ArchivedOrder.objects.filter(user_id=userId).prefetch_related('items__product')
+        data = list(data) + list(ArchivedOrderSerializer(archived, many=True).data)
+
+    return Response(data)
 
-# Initiate a cryptocurrency payment for an order (Fixed to USDT)
+# Query parameters shared by the order export endpoints
+ORDER_EXPORT_PARAMETERS = [
+    OpenApiParameter(name='export_format', type=str, enum=list(EXPORT_FORMATS), required=False,
+                     description="csv (one row per order line, default) or ndjson (one order per line)"),
+    OpenApiParameter(name='date_from', type=str, required=False, description="First day included (YYYY-MM-DD)"),
+    OpenApiParameter(name='date_to', type=str, required=False, description="Last day included (YYYY-MM-DD)"),
+    OpenApiParameter(name='include_archived', type=bool, required=False,
+                     description="Also export orders moved to the archive"),
+]
+
+# Build a streamed, gzip-compressed export response (orders of one user, or all orders)
+def streamOrderExport(request, userId=None):
+    export_format = request.query_params.get('export_format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return Response({"error": f"export_format must be one of {', '.join(EXPORT_FORMATS)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    dates = {}
+    for name in ('date_from', 'date_to'):
+        value = request.query_params.get(name)
+        try:
+            dates[name] = parse_date(value) if value else None
+        except ValueError: # Well-formed but impossible date (e.g. 2024-02-30)
+            dates[name] = None
+        if value and dates[name] is None:
+            return Response({"error": f"{name} must be a date (YYYY-MM-DD)"}, status=status.HTTP_400_BAD_REQUEST)
+
+    include_archived = request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes')
+    orders = iter_orders(export_querysets(userId, dates['date_from'], dates['date_to'], include_archived))
+
+    response = StreamingHttpResponse(export_orders(orders, export_format), content_type='application/gzip')
+    response['Content-Disposition'] = f'attachment; filename="orders.{export_format}.gz"'
+    return response
+
+# Export the orders of a user (streamed, gzip-compressed)
+@extend_schema(parameters=ORDER_EXPORT_PARAMETERS, responses={(200, 'application/gzip'): bytes})
+@api_view(['GET'])
+def exportUserOrders(request, userId):
+    get_object_or_404(User, id=userId)
+    return streamOrderExport(request, userId)
+
+# Export all orders (Admin, streamed, gzip-compressed)
+@extend_schema(parameters=ORDER_EXPORT_PARAMETERS, responses={(200, 'application/gzip'): bytes})
+@api_view(['GET'])
+def exportAllOrders(request):
+    return streamOrderExport(request)
+
+# Initiate a cryptocurrency payment for an order (USDT, USDC, BTC or ETH at the cached exchange rate)
 @extend_schema(
     request=CryptoPaymentSerializer,
     responses={201: CryptoPaymentSerializer}
@@ -207,14 +292,23 @@ def payWithCrypto(request, orderId):
     
     serializer = CryptoPaymentSerializer(data=request.data)
     if serializer.is_valid():
+        currency = serializer.validated_data['crypto_currency']
+        try:
+            rate = get_rate(currency)
+        except RateUnavailable:
+            return Response({"error": f"Exchange rate for {currency} is currently unavailable"},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
         # Generate a simulated 64-character blockchain transaction hash
         simulated_hash = secrets.token_hex(32)
         
-        # Automatically set the amount in USDT (1:1 ratio with USD/Price)
+        # Amount in crypto = USD price / USD rate, rounded up to the smallest stored unit
+        crypto_amount = (order.total_price / rate.rate).quantize(Decimal('0.00000001'), rounding=ROUND_UP)
         payment = serializer.save(
             order=order, 
-            crypto_amount=order.total_price, 
-            crypto_currency='USDT',
+            crypto_amount=crypto_amount, 
+            exchange_rate=rate.rate,
+            rate_fetched_at=rate.fetched_at_datetime,
             transaction_hash=simulated_hash
         )
         order.payment_method = 'crypto'
@@ -44,6 +44,16 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # Number of reverse proxies in front of the app: the client IP used by the throttles is taken
+    # from X-Forwarded-For only past that many proxies (0: REMOTE_ADDR only, the header is ignored)
+    'NUM_PROXIES': 0,
+    # Token bucket rates (see ecommerce/throttles.py): 'N/period' = bursts of N, refilled at N per period
+    'DEFAULT_THROTTLE_RATES': {
+        'auth': '20/min',           # login + register, per client IP
+        'login_account': '5/min',   # login, per email
+        'checkout': '30/min',       # createOrder, per client IP
+        'checkout_user': '10/min',  # createOrder, per user
+    },
 }
 
 MIDDLEWARE = [
@@ -93,6 +103,15 @@ DATABASES = {
 
 
 
+# Cache (exchange rates, ...)
+# LocMemCache is per process: use a shared backend (Redis, Memcached) in production
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -133,3 +152,70 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Order archival (hot/cold storage)
+# Shipped/cancelled orders older than this many days are moved to the archive tables
+ORDER_ARCHIVE_AFTER_DAYS = 180
+
+# Number of orders moved per transaction
+ORDER_ARCHIVE_CHUNK_SIZE = 500
+
+# Directory receiving the compressed JSONL exports of archived orders
+ORDER_ARCHIVE_DIR = BASE_DIR / 'archive'
+
+
+# "Frequently bought together" recommendations
+# Number of related products returned by /products/<id>/related/
+RELATED_PRODUCTS_LIMIT = 10
+
+# Number of order ids counted per query by rebuild_cooccurrence
+COOCCURRENCE_REBUILD_CHUNK_SIZE = 5000
+
+# Number of product ids whose pairs are counted together by rebuild_cooccurrence (bounds its memory use)
+COOCCURRENCE_REBUILD_PRODUCT_CHUNK_SIZE = 1000
+
+# Pairs kept per product by rebuild_cooccurrence and trimming (a margin above RELATED_PRODUCTS_LIMIT
+# so pairs can still climb into the top K between two rebuilds)
+COOCCURRENCE_KEEP_PER_PRODUCT = 50
+
+
+# Order exports
+# Number of orders loaded (with their lines and payment) per query while streaming an export
+ORDER_EXPORT_CHUNK_SIZE = 2000
+
+
+# Crypto payments
+CRYPTO_CURRENCIES = ['USDT', 'USDC', 'BTC', 'ETH']
+
+# Exchange rate source: ecommerce.rates.FixtureRateProvider (fixed rates below) or ecommerce.rates.CoinGeckoRateProvider
+CRYPTO_RATE_PROVIDER = 'ecommerce.rates.FixtureRateProvider'
+
+# USD price of 1 unit, used by FixtureRateProvider
+CRYPTO_FIXTURE_RATES = {'USDT': '1', 'USDC': '1', 'BTC': '60000', 'ETH': '3000'}
+
+# A rate is fresh for CRYPTO_RATE_TTL seconds, and refreshed in the background once
+# CRYPTO_RATE_REFRESH_AHEAD of that time has passed
+CRYPTO_RATE_TTL = 60
+CRYPTO_RATE_REFRESH_AHEAD = 0.8
+
+# After the TTL, the last rate is still served (while a refresh runs) for this many seconds
+CRYPTO_RATE_STALE_TTL = 300
+
+# Timeout (seconds) of a request to the rate provider
+CRYPTO_RATE_FETCH_TIMEOUT = 5
+
+# Polling interval (seconds) of requests waiting for a rate being fetched by another request
+CRYPTO_RATE_WAIT_INTERVAL = 0.05
+
+
+# Load shedding
+# Maximum number of requests running at the same time on the expensive endpoints
+# (auth: login/register password hashing, checkout: createOrder)
+CONCURRENCY_LIMITS = {'auth': 8, 'checkout': 16}
+
+# Seconds after which a concurrency slot expires (recovers slots of killed workers)
+CONCURRENCY_SLOT_TIMEOUT = 60
+
+# Retry-After (seconds) sent when a request is rejected by a concurrency limit
+CONCURRENCY_RETRY_AFTER = 1